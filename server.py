@@ -1,25 +1,202 @@
 """
 3D Animation Agent - Backend Server
 FastAPI backend for handling 3D model uploads and processing
+Requires Python 3.11+
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Request, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
+import asyncio
+from contextlib import asynccontextmanager
+import hashlib
+import io
 import os
-import shutil
-import uuid
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, fields
 from datetime import datetime
 from pathlib import Path
-import json
+from urllib.parse import quote
+import orjson
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load persisted models in each worker before it serves requests"""
+    await load_models()
+    yield
+
 
 app = FastAPI(
     title="3D Animation Agent API",
     description="Backend for 3D model upload and animation processing",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+
+# Create upload directory. This is the permanent model store and holds
+# the metadata database too; point UPLOAD_DIR at tmpfs (e.g.
+# /dev/shm/uploads) only if losing every model on reboot is acceptable.
+UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", "uploads"))
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# Read/copy chunk size for saving uploads; 1 MiB keeps syscall count low
+# on multi-MB models without holding much memory per request
+COPY_BUFSIZE = 1 << 20
+
+# Largest model accepted by /api/upload, in bytes
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 512 << 20))
+_MULTIPART_SLACK = 64 << 10
+
+# Frontend page, read once since it is served on every visit
+_INDEX_HTML = Path("index.html").read_bytes()
+
+# Last (whole second, ISO string) pair returned by now_iso
+_ts_cache = [None, ""]
+
+# Single byte range: "bytes=first-last", "bytes=first-" or "bytes=-suffix"
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)", re.ASCII)
+
+# Units for format_file_size, each 1024x the previous
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB", "PB")
+
+# Supported file formats
+SUPPORTED_FORMATS = frozenset({".glb", ".gltf", ".obj", ".fbx"})
+_UNSUPPORTED_MSG = f"Unsupported file format. Supported: {', '.join(sorted(SUPPORTED_FORMATS))}"
+
+# Animation presets with parameters
+ANIMATION_PRESETS = {
+    "rotate": {"axis": "y", "speed": 1.0, "description": "Smooth Y-axis rotation"},
+    "spin": {"axis": "y", "speed": 3.0, "description": "Fast 360° spinning"},
+    "bounce": {"height": 0.5, "frequency": 3, "description": "Vertical bouncing"},
+    "float": {"height": 0.2, "frequency": 1.5, "description": "Gentle hovering"},
+    "pulse": {"scale": 0.1, "frequency": 3, "description": "Breathing scale effect"},
+    "wave": {"amplitude": 0.3, "frequency": 2, "description": "Oscillating motion"},
+    "shake": {"amplitude": 0.05, "frequency": 20, "description": "Quick vibration"},
+    "swing": {"angle": 0.5, "frequency": 2, "description": "Pendulum motion"},
+    "jump": {"height": 0.8, "squash": 0.1, "description": "Jump with squash/stretch"},
+    "dance": {"complexity": "high", "description": "Fun dance moves"},
+    "wobble": {"x_angle": 0.2, "z_angle": 0.2, "description": "Unstable wobbling"},
+    "roll": {"axis": "x", "speed": 2, "description": "X-axis rotation"},
+    "flip": {"axis": "x", "bounce": True, "description": "Flip with bounce"},
+    "breathe": {"scale": 0.05, "frequency": 1.5, "description": "Subtle breathing"},
+    "walk": {"step_height": 0.1, "sway": 0.1, "description": "Walking motion"}
+}
+_UNKNOWN_ANIM_MSG_TEMPLATE = "Unknown animation '{}'. Available: " + ", ".join(sorted(ANIMATION_PRESETS))
+ANIMATION_NAMES = tuple(ANIMATION_PRESETS)
+
+# Payload for /api/animations, serialized once since it never changes
+_ANIMATIONS_JSON = orjson.dumps({
+    "motion": [
+        {"name": "rotate", "icon": "sync-alt", "description": "Smooth rotation"},
+        {"name": "spin", "icon": "redo", "description": "Fast spinning"},
+        {"name": "bounce", "icon": "arrow-up", "description": "Bouncing"},
+        {"name": "float", "icon": "feather", "description": "Hovering"},
+        {"name": "jump", "icon": "arrow-up", "description": "Jumping"},
+        {"name": "walk", "icon": "walking", "description": "Walking"}
+    ],
+    "effects": [
+        {"name": "pulse", "icon": "heartbeat", "description": "Pulsing"},
+        {"name": "wave", "icon": "water", "description": "Waving"},
+        {"name": "shake", "icon": "hand-paper", "description": "Shaking"},
+        {"name": "swing", "icon": "bezier-curve", "description": "Swinging"},
+        {"name": "wobble", "icon": "random", "description": "Wobbling"},
+        {"name": "breathe", "icon": "lungs", "description": "Breathing"}
+    ],
+    "special": [
+        {"name": "dance", "icon": "music", "description": "Dancing"},
+        {"name": "roll", "icon": "sync", "description": "Rolling"},
+        {"name": "flip", "icon": "retweet", "description": "Flipping"}
+    ]
+})
+
+
+@dataclass(slots=True)
+class ModelInfo:
+    """Metadata for an uploaded model"""
+    id: str
+    filename: str
+    format: str
+    size: int
+    uploaded_at: str
+    file_path: str
+    # Every model shares the one ANIMATION_NAMES tuple
+    available_animations: tuple = ANIMATION_NAMES
+    status: str = "ready"
+    content_hash: str = ""
+
+    @classmethod
+    def from_json(cls, data) -> "ModelInfo":
+        """Rebuild from a stored record, ignoring fields no longer kept"""
+        record = orjson.loads(data)
+        animations = tuple(record.get("available_animations", ANIMATION_NAMES))
+        record["available_animations"] = ANIMATION_NAMES if animations == ANIMATION_NAMES else animations
+        return cls(**{f.name: record[f.name] for f in fields(cls) if f.name in record})
+
+
+# Model metadata is persisted here so it survives restarts. The store is
+# shared by all workers and is the only copy; once MAX_MODELS is exceeded
+# the least recently used model is evicted along with its file.
+MAX_MODELS = 1024
+DB_PATH = UPLOAD_DIR / "models.db"
+_db_local = threading.local()
+
+# Seconds between last_used updates for the same model
+_TOUCH_INTERVAL = 60.0
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Cap the request body of /api/upload while it streams in
+    Plain ASGI rather than BaseHTTPMiddleware, so other routes pay nothing
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != "/api/upload":
+            await self.app(scope, receive, send)
+            return
+
+        # The body also carries multipart framing around the file, so allow
+        # some slack here; copy_upload enforces the exact cap on the file
+        limit = MAX_UPLOAD_SIZE + _MULTIPART_SLACK
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    response = ORJSONResponse(status_code=413, content={"detail": _TOO_LARGE_MSG})
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the route's body parsing, so FastAPI
+                    # turns it into a normal 413 response
+                    raise_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# Registered after the constants the middleware reads. Added before CORS
+# so it runs inside it and its 413s get CORS headers
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # CORS middleware for frontend communication
 app.add_middleware(
     CORSMiddleware,
@@ -29,21 +206,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create upload directory
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-
-# Supported file formats
-SUPPORTED_FORMATS = {".glb", ".gltf", ".obj", ".fbx"}
 
-# Store model metadata
-models_db = {}
+async def load_models():
+    """Set up the metadata store and drop models whose files are gone"""
+    await asyncio.to_thread(db_init)
+    models = await asyncio.to_thread(db_load)
+    stale = [model.id for model in models if not os.path.exists(model.file_path)]
+    await asyncio.to_thread(db_delete, stale)
+    await asyncio.to_thread(evict_models)
 
 
 @app.get("/")
 async def root():
     """Root endpoint - serves the frontend"""
-    return FileResponse("index.html")
+    return Response(content=_INDEX_HTML, media_type="text/html")
 
 
 @app.get("/api")
@@ -65,7 +241,7 @@ async def api_info():
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "timestamp": now_iso()}
 
 
 @app.post("/api/upload")
@@ -75,105 +251,154 @@ async def upload_model(file: UploadFile = File(...)):
     Returns model info including ID, filename, and available animations
     """
     # Validate file extension
-    file_ext = Path(file.filename).suffix.lower()
+    file_ext = os.path.splitext(file.filename or "")[1].lower()
     if file_ext not in SUPPORTED_FORMATS:
         raise HTTPException(
             status_code=400,
-            detail=f"Unsupported file format. Supported: {', '.join(SUPPORTED_FORMATS)}"
+            detail=_UNSUPPORTED_MSG
         )
     
-    # Generate unique ID
-    model_id = str(uuid.uuid4())[:8]
-    
-    # Save file
-    file_path = UPLOAD_DIR / f"{model_id}{file_ext}"
+    # Identical content in the same format gets its own record that shares
+    # the already stored file, which skips writing it again. The trade-off is
+    # that every upload is read once through user space to hash it before
+    # the zero-copy write, so new uploads are read twice.
+    file_format = file_ext[1:].upper()
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        content_hash = await asyncio.to_thread(hash_upload, file.file, MAX_UPLOAD_SIZE)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to save file") from e
+    uploaded_at = now_iso()
+    model_info = await asyncio.to_thread(
+        db_insert_duplicate, content_hash, file_format,
+        lambda existing, model_id: ModelInfo(
+            id=model_id,
+            filename=file.filename,
+            format=file_format,
+            size=existing.size,
+            uploaded_at=uploaded_at,
+            file_path=existing.file_path,
+            content_hash=content_hash
+        )
+    )
+    if model_info is not None:
+        await asyncio.to_thread(evict_models)
+        return {
+            "success": True,
+            "message": "Model uploaded successfully",
+            "model": model_info
+        }
     
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    # Reserve a fresh id in the store before writing, so concurrent
+    # uploads in other workers can never claim the same id or file
+    model_info = await asyncio.to_thread(db_insert_new, lambda model_id: ModelInfo(
+        id=model_id,
+        filename=file.filename,
+        format=file_format,
+        size=0,
+        uploaded_at=uploaded_at,
+        file_path=os.path.join(UPLOAD_DIR, f"{model_id}{file_ext}"),
+        status="uploading"
+    ))
     
-    # Create model metadata
-    model_info = {
-        "id": model_id,
-        "filename": file.filename,
-        "format": file_ext[1:].upper(),
-        "size": file_size,
-        "size_formatted": format_file_size(file_size),
-        "uploaded_at": datetime.now().isoformat(),
-        "file_path": str(file_path),
-        "available_animations": [
-            "rotate", "spin", "bounce", "float", "pulse", 
-            "wave", "shake", "swing", "jump", "dance",
-            "wobble", "roll", "flip", "breathe", "walk"
-        ],
-        "status": "ready"
-    }
+    # Save file
+    # Disk I/O runs in a worker thread so concurrent uploads don't queue
+    # behind each other on the event loop
+    try:
+        model_info.size = await asyncio.to_thread(save_upload, file.file, model_info.file_path)
+    except Exception as e:
+        await asyncio.to_thread(db_delete, [model_info.id])
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail="Failed to save file") from e
+    model_info.status = "ready"
+    model_info.content_hash = content_hash
     
-    # Store in memory database
-    models_db[model_id] = model_info
+    # Persist the metadata, then make room if the store is over capacity
+    await asyncio.to_thread(db_save, model_info)
+    await asyncio.to_thread(evict_models)
     
-    return JSONResponse(content={
+    return {
         "success": True,
         "message": "Model uploaded successfully",
         "model": model_info
-    })
+    }
 
 
 @app.get("/api/models")
 async def list_models():
     """List all uploaded models"""
-    return {
-        "count": len(models_db),
-        "models": list(models_db.values())
-    }
+    # Read from the store so every worker sees every worker's uploads. The
+    # rows are already orjson-encoded, so they are spliced in as-is
+    rows = await asyncio.to_thread(db_load_raw)
+    body = b'{"count":%d,"models":[%b]}' % (len(rows), b",".join(rows))
+    return Response(content=body, media_type="application/json")
 
 
 @app.get("/api/models/{model_id}")
 async def get_model(model_id: str):
     """Get a specific model by ID"""
-    if model_id not in models_db:
-        raise HTTPException(status_code=404, detail="Model not found")
-    return models_db[model_id]
+    return await lookup_model(model_id)
 
 
 @app.get("/api/models/{model_id}/download")
-async def download_model(model_id: str):
-    """Download a model file"""
-    if model_id not in models_db:
-        raise HTTPException(status_code=404, detail="Model not found")
-    
-    model = models_db[model_id]
-    file_path = Path(model["file_path"])
+async def download_model(model_id: str, request: Request):
+    """
+    Download a model file
+    Honors a single-range Range header so large downloads can resume
+    """
+    model = await lookup_model(model_id)
+    file_path = model.file_path
     
-    if not file_path.exists():
+    try:
+        file_size = os.stat(file_path).st_size
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found on disk")
     
-    return FileResponse(
-        path=file_path,
-        filename=model["filename"],
-        media_type="application/octet-stream"
+    byte_range = parse_range(request.headers.get("range"), file_size)
+    if byte_range is None:
+        return FileResponse(
+            path=file_path,
+            filename=model.filename,
+            media_type="application/octet-stream",
+            headers={"Accept-Ranges": "bytes"}
+        )
+    
+    if byte_range is False:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    
+    start, end = byte_range
+    filename = quote(model.filename)
+    if filename != model.filename:
+        disposition = f"attachment; filename*=utf-8''{filename}"
+    else:
+        disposition = f'attachment; filename="{filename}"'
+    return StreamingResponse(
+        iter_file_range(file_path, start, end - start + 1),
+        status_code=206,
+        media_type="application/octet-stream",
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{file_size}",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": disposition
+        }
     )
 
 
 @app.delete("/api/models/{model_id}")
 async def delete_model(model_id: str):
     """Delete a model"""
-    if model_id not in models_db:
-        raise HTTPException(status_code=404, detail="Model not found")
+    await lookup_model(model_id)
     
-    model = models_db[model_id]
-    file_path = Path(model["file_path"])
-    
-    # Delete file
-    if file_path.exists():
-        os.remove(file_path)
-    
-    # Remove from database
-    del models_db[model_id]
+    # Remove from database; the file goes too unless a deduplicated
+    # upload still shares it
+    await asyncio.to_thread(db_delete, [model_id])
     
     return {"success": True, "message": "Model deleted successfully"}
 
@@ -189,35 +414,15 @@ async def animate_model(request: dict):
     speed = request.get("speed", 1.0)
     duration = request.get("duration", 5)
     
-    # Animation presets with parameters
-    animation_presets = {
-        "rotate": {"axis": "y", "speed": 1.0, "description": "Smooth Y-axis rotation"},
-        "spin": {"axis": "y", "speed": 3.0, "description": "Fast 360° spinning"},
-        "bounce": {"height": 0.5, "frequency": 3, "description": "Vertical bouncing"},
-        "float": {"height": 0.2, "frequency": 1.5, "description": "Gentle hovering"},
-        "pulse": {"scale": 0.1, "frequency": 3, "description": "Breathing scale effect"},
-        "wave": {"amplitude": 0.3, "frequency": 2, "description": "Oscillating motion"},
-        "shake": {"amplitude": 0.05, "frequency": 20, "description": "Quick vibration"},
-        "swing": {"angle": 0.5, "frequency": 2, "description": "Pendulum motion"},
-        "jump": {"height": 0.8, "squash": 0.1, "description": "Jump with squash/stretch"},
-        "dance": {"complexity": "high", "description": "Fun dance moves"},
-        "wobble": {"x_angle": 0.2, "z_angle": 0.2, "description": "Unstable wobbling"},
-        "roll": {"axis": "x", "speed": 2, "description": "X-axis rotation"},
-        "flip": {"axis": "x", "bounce": True, "description": "Flip with bounce"},
-        "breathe": {"scale": 0.05, "frequency": 1.5, "description": "Subtle breathing"},
-        "walk": {"step_height": 0.1, "sway": 0.1, "description": "Walking motion"}
-    }
-    
-    if animation_type not in animation_presets:
-        available = list(animation_presets.keys())
+    preset = ANIMATION_PRESETS.get(animation_type)
+    if preset is None:
         raise HTTPException(
             status_code=400,
-            detail=f"Unknown animation '{animation_type}'. Available: {', '.join(available)}"
+            detail=_UNKNOWN_ANIM_MSG_TEMPLATE.format(animation_type)
         )
     
-    preset = animation_presets[animation_type]
-    
-    return {
+    # Echoes client values as-is; orjson rejects ints wider than 64 bits
+    return JSONResponse(content={
         "success": True,
         "animation": {
             "type": animation_type,
@@ -227,49 +432,383 @@ async def animate_model(request: dict):
             "model_id": model_id
         },
         "message": f"Animation '{animation_type}' applied: {preset['description']}"
-    }
+    })
 
 
 @app.get("/api/animations")
 async def list_animations():
     """List all available animations with descriptions"""
-    animations = {
-        "motion": [
-            {"name": "rotate", "icon": "sync-alt", "description": "Smooth rotation"},
-            {"name": "spin", "icon": "redo", "description": "Fast spinning"},
-            {"name": "bounce", "icon": "arrow-up", "description": "Bouncing"},
-            {"name": "float", "icon": "feather", "description": "Hovering"},
-            {"name": "jump", "icon": "arrow-up", "description": "Jumping"},
-            {"name": "walk", "icon": "walking", "description": "Walking"}
-        ],
-        "effects": [
-            {"name": "pulse", "icon": "heartbeat", "description": "Pulsing"},
-            {"name": "wave", "icon": "water", "description": "Waving"},
-            {"name": "shake", "icon": "hand-paper", "description": "Shaking"},
-            {"name": "swing", "icon": "bezier-curve", "description": "Swinging"},
-            {"name": "wobble", "icon": "random", "description": "Wobbling"},
-            {"name": "breathe", "icon": "lungs", "description": "Breathing"}
-        ],
-        "special": [
-            {"name": "dance", "icon": "music", "description": "Dancing"},
-            {"name": "roll", "icon": "sync", "description": "Rolling"},
-            {"name": "flip", "icon": "retweet", "description": "Flipping"}
-        ]
-    }
-    return animations
+    return Response(content=_ANIMATIONS_JSON, media_type="application/json")
+
+
+async def lookup_model(model_id: str) -> ModelInfo:
+    """Get a model's metadata from the store, marking it recently used"""
+    model = await asyncio.to_thread(db_touch, model_id)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    return model
+
+
+def parse_range(header, file_size: int):
+    """
+    Parse a Range header into an inclusive (start, end) pair
+    Returns None to serve the whole file, False if unsatisfiable
+    """
+    # Absent, foreign-unit, multi-range and malformed headers are ignored
+    # and get the full body, as RFC 9110 requires for invalid ranges
+    match = _RANGE_RE.fullmatch(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if not last:
+            end = file_size - 1
+        else:
+            end = int(last)
+            if start > end:
+                return None
+    elif last:
+        # Suffix range: the last N bytes; a zero-length suffix is valid
+        # syntax but can never be satisfied
+        if not int(last):
+            return False
+        start = max(file_size - int(last), 0)
+        end = file_size - 1
+    else:
+        return None
+    if start >= file_size:
+        return False
+    return start, min(end, file_size - 1)
+
+
+def iter_file_range(file_path: str, start: int, length: int):
+    """Yield length bytes of file_path from start, COPY_BUFSIZE at a time"""
+    # Starlette runs sync iterators in its threadpool, so pread's blocking
+    # I/O stays off the event loop
+    with open(file_path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        while length > 0:
+            chunk = os.pread(fd, min(COPY_BUFSIZE, length), start)
+            if not chunk:
+                break
+            start += len(chunk)
+            length -= len(chunk)
+            yield chunk
+
+
+def evict_models():
+    """Delete least recently used models until the store fits MAX_MODELS"""
+    conn = db_connect()
+    with conn:
+        # Take the write lock first so concurrent workers evict in turn
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT data FROM models ORDER BY last_used, rowid "
+            "LIMIT max((SELECT COUNT(*) FROM models) - ?, 0)",
+            (MAX_MODELS,)
+        ).fetchall()
+        delete_models(conn, [ModelInfo.from_json(data) for (data,) in rows])
+
+
+def delete_models(conn: sqlite3.Connection, models: list):
+    """
+    Delete models' rows, then any of their files no remaining row shares
+    Call inside a BEGIN IMMEDIATE transaction, so no upload can start
+    sharing a file between the check and the unlink
+    """
+    conn.executemany("DELETE FROM models WHERE id = ?", [(model.id,) for model in models])
+    for model in models:
+        if model.content_hash:
+            rows = conn.execute(
+                "SELECT data FROM models WHERE content_hash = ?", (model.content_hash,)
+            ).fetchall()
+            if any(ModelInfo.from_json(data).file_path == model.file_path for (data,) in rows):
+                continue
+        try:
+            os.remove(model.file_path)
+        except FileNotFoundError:
+            pass
+
+
+def db_connect() -> sqlite3.Connection:
+    """Return this thread's connection to the metadata store"""
+    # Store calls run on the to_thread pool; each pool thread keeps one
+    # connection open instead of reconnecting per call
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        conn = _db_local.conn = sqlite3.connect(DB_PATH, timeout=30)
+    return conn
+
+
+def db_init():
+    """Create the store's schema; run once per worker at startup"""
+    conn = db_connect()
+    # Workers share the store; WAL lets readers proceed during a write
+    conn.execute("PRAGMA journal_mode=WAL")
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS models "
+            "(id TEXT PRIMARY KEY, data TEXT NOT NULL, content_hash TEXT, last_used REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS models_content_hash ON models (content_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS models_last_used ON models (last_used)")
+
+
+def db_insert_new(build) -> ModelInfo:
+    """
+    Store a model under a fresh random id and return it
+    build(model_id) makes the record; ids already taken are retried
+    """
+    conn = db_connect()
+    while True:
+        # 8 hex chars collide often enough that the insert must check
+        model = build(secrets.token_hex(4))
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO models (id, data, content_hash, last_used) VALUES (?, ?, ?, ?)",
+                    (model.id, orjson.dumps(model), model.content_hash or None, time.time())
+                )
+        except sqlite3.IntegrityError:
+            continue
+        return model
+
+
+def db_save(model: ModelInfo):
+    """Update a stored model's metadata"""
+    conn = db_connect()
+    with conn:
+        conn.execute(
+            "UPDATE models SET data = ?, content_hash = ?, last_used = ? WHERE id = ?",
+            (orjson.dumps(model), model.content_hash or None, time.time(), model.id)
+        )
+
+
+def db_touch(model_id: str):
+    """Mark a model recently used and return its metadata, or None"""
+    conn = db_connect()
+    row = conn.execute("SELECT data, last_used FROM models WHERE id = ?", (model_id,)).fetchone()
+    if row is None:
+        return None
+    data, last_used = row
+    # Eviction only needs coarse recency, so most touches stay plain reads
+    # and don't contend for the store's write lock
+    now = time.time()
+    if last_used is None or now - last_used >= _TOUCH_INTERVAL:
+        with conn:
+            conn.execute("UPDATE models SET last_used = ? WHERE id = ?", (now, model_id))
+    return ModelInfo.from_json(data)
+
+
+def db_insert_duplicate(content_hash: str, file_format: str, build):
+    """
+    Store a new record sharing the file of a stored model with the same
+    content hash and format, and return it; None if there is no such model
+    build(existing, model_id) makes the record
+    """
+    conn = db_connect()
+    with conn:
+        # Holding the write lock keeps the shared file from being deleted
+        # between finding it and adding a row that references it
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT data FROM models WHERE content_hash = ?", (content_hash,)
+        ).fetchall()
+        # At most a few rows share a hash, so this scan stays tiny
+        for (data,) in rows:
+            existing = ModelInfo.from_json(data)
+            if existing.format == file_format and os.path.exists(existing.file_path):
+                break
+        else:
+            return None
+        while True:
+            model = build(existing, secrets.token_hex(4))
+            try:
+                conn.execute(
+                    "INSERT INTO models (id, data, content_hash, last_used) VALUES (?, ?, ?, ?)",
+                    (model.id, orjson.dumps(model), model.content_hash, time.time())
+                )
+            except sqlite3.IntegrityError:
+                continue
+            return model
+
+
+def db_delete(model_ids: list):
+    """Remove models from the store, along with files no other model shares"""
+    if not model_ids:
+        return
+    conn = db_connect()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        models = []
+        for model_id in model_ids:
+            row = conn.execute("SELECT data FROM models WHERE id = ?", (model_id,)).fetchone()
+            if row:
+                models.append(ModelInfo.from_json(row[0]))
+        delete_models(conn, models)
+
+
+def db_load() -> list:
+    """Load all persisted models, oldest first"""
+    conn = db_connect()
+    rows = conn.execute("SELECT data FROM models ORDER BY rowid").fetchall()
+    return [ModelInfo.from_json(data) for (data,) in rows]
+
+
+def db_load_raw() -> list:
+    """Load all persisted models' encoded JSON, oldest first"""
+    conn = db_connect()
+    return [data for (data,) in conn.execute("SELECT data FROM models ORDER BY rowid")]
+
+
+def hash_upload(src, limit: int) -> str:
+    """
+    Hash an uploaded file object's content, then rewind it
+    Raises 413 past limit bytes, so oversized uploads are never written
+    """
+    start = src.tell()
+    digest = hashlib.blake2b(digest_size=16)
+    total = 0
+    while chunk := src.read(COPY_BUFSIZE):
+        total += len(chunk)
+        if total > limit:
+            raise_too_large()
+        digest.update(chunk)
+    src.seek(start)
+    return digest.hexdigest()
+
+
+def save_upload(src, file_path: str) -> int:
+    """Write an uploaded file object to file_path and return its size"""
+    # "x" refuses to truncate a file some other upload already owns
+    buffer = open(file_path, "xb")
+    try:
+        with buffer:
+            return copy_upload(src, buffer, MAX_UPLOAD_SIZE)
+    except BaseException:
+        # Don't leave partial or oversized files behind
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def copy_upload(src, dst, limit: int) -> int:
+    """
+    Copy an uploaded file object into dst, zero-copy when possible
+    Returns the number of bytes written; raises 413 past limit bytes
+    """
+    total = 0
+
+    # Spooled uploads that are still in memory have no real fd; asking for
+    # one would force a rollover to disk just to read it back again
+    src_fd = None
+    if getattr(src, "_rolled", True) and _FD_TRANSFERS:
+        try:
+            src_fd = src.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            src_fd = None
+
+    if src_fd is not None:
+        # Explicit offsets keep the kernel from moving the buffered file
+        # objects' positions behind their backs; resync them afterwards
+        src_start = offset = src.tell()
+        src_end = os.fstat(src_fd).st_size
+        if src_end - src_start > limit:
+            raise_too_large()
+        dst.flush()
+        dst_fd = dst.fileno()
+        dst_start = dst.tell()
+        # Either call may be unsupported for this pair of files (e.g.
+        # copy_file_range across filesystems), so each picks up wherever
+        # the previous one stopped
+        for transfer in _FD_TRANSFERS:
+            try:
+                while offset < src_end:
+                    sent = transfer(
+                        src_fd, dst_fd, offset, dst_start + offset - src_start,
+                        min(8 * 1024 * 1024, src_end - offset)
+                    )
+                    if not sent:
+                        break
+                    offset += sent
+            except OSError:
+                pass
+            if offset >= src_end:
+                break
+        total = offset - src_start
+        src.seek(offset)
+        dst.seek(dst_start + total)
+        if offset >= src_end:
+            return total
+
+    buf = bytearray(COPY_BUFSIZE)
+    mv = memoryview(buf)
+    while n := src.readinto(buf):
+        total += n
+        if total > limit:
+            raise_too_large()
+        dst.write(mv[:n])
+    return total
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, src_off: int, dst_off: int, count: int) -> int:
+    """Copy in-kernel; reflinks on CoW filesystems, server-side on NFS"""
+    return os.copy_file_range(src_fd, dst_fd, count, src_off, dst_off)
+
+
+def _sendfile(src_fd: int, dst_fd: int, src_off: int, dst_off: int, count: int) -> int:
+    """Copy in-kernel through the page cache"""
+    # sendfile always writes at the destination's file position
+    os.lseek(dst_fd, dst_off, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, src_off, count)
+
+
+# Zero-copy strategies for copy_upload, best first, as this platform has
+_FD_TRANSFERS = tuple(
+    transfer for transfer, name in (
+        (_copy_file_range, "copy_file_range"),
+        (_sendfile, "sendfile")
+    ) if hasattr(os, name)
+)
+
+
+def raise_too_large():
+    """Abort an upload that went past MAX_UPLOAD_SIZE"""
+    raise HTTPException(
+        status_code=413,
+        detail=_TOO_LARGE_MSG
+    )
+
+
+def now_iso() -> str:
+    """Current time as ISO 8601, reformatted at most once a second"""
+    t = time.time()
+    # Keyed on the second itself, so a clock stepping backwards refreshes
+    # the value instead of freezing it until the clock catches up
+    second = int(t)
+    if second != _ts_cache[0]:
+        _ts_cache[:] = [second, datetime.fromtimestamp(t).isoformat()]
+    return _ts_cache[1]
 
 
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human readable format"""
-    for unit in ["B", "KB", "MB", "GB"]:
-        if size_bytes < 1024:
-            return f"{size_bytes:.1f} {unit}"
-        size_bytes /= 1024
-    return f"{size_bytes:.1f} TB"
+    # Each unit is 2**10 of the previous, so bit_length picks it directly
+    i = min(max(size_bytes.bit_length() - 1, 0) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * i)):.1f} {_SIZE_UNITS[i]}"
+
 
+# Built once here since it needs format_file_size
+_TOO_LARGE_MSG = f"File too large. Maximum size: {format_file_size(MAX_UPLOAD_SIZE)}"
 
-# Serve static files (frontend)
-app.mount("/", StaticFiles(directory=".", html=True), name="static")
+
+# Serve the frontend's asset directories; the page itself is served by
+# root() from memory. Nothing else in the working directory is exposed.
+app.mount("/css", StaticFiles(directory="css"), name="css")
+app.mount("/js", StaticFiles(directory="js"), name="js")
 
 
 if __name__ == "__main__":
@@ -277,4 +816,14 @@ if __name__ == "__main__":
     print("Starting 3D Animation Agent Backend...")
     print("API docs available at: http://localhost:8000/docs")
     print("Frontend available at: http://localhost:8000")
-    uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=False)
+    # One worker per core; "auto" picks uvloop and httptools when they are
+    # installed (uvicorn[standard]) and falls back to asyncio/h11 otherwise
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="auto",
+        http="auto",
+        log_level="warning"
+    )